@@ -1,5 +1,6 @@
 """Gunicorn configuration"""
 
+import gc
 import os
 import multiprocessing
 
@@ -14,6 +15,27 @@ workers = 2 * multiprocessing.cpu_count() + 1
 worker_class = "gevent"
 worker_connections = 1000
 
+# Create the app once, in the master process, before forking workers. Workers
+# then share the imported modules and the preloaded translation cache
+# (copy-on-write), and start without importing or preloading anything.
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything created so far out of the garbage collector's view, so
+    # that collections in workers do not write to (and so copy) shared pages.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # With preload_app, the app was created before forking. Give each worker
+    # its own database connections, signal handlers, etc.
+    if worker.cfg.preload_app:
+        from ncwms_mm_rproxy import after_fork
+
+        after_fork(worker.wsgi)
+
+
 # Override default configuration with environment variables with names beginning
 # `GUNICORN_`. Slightly perverse perverse given that gunicorn's built-in
 # configuration through env variables is of the lowest priority, and this makes
@@ -23,3 +45,15 @@ for k, v in os.environ.items():
     if k.startswith("GUNICORN_"):
         key = k.split("_", 1)[1].lower()
         locals()[key] = v
+
+# gevent workers monkey-patch the standard library when they start. With
+# preload_app, the app and the modules it uses (requests, urllib3, the
+# database driver) are imported earlier, in the master, so patch here: this
+# file is loaded before the app is imported, so those modules see the patched
+# socket, ssl, etc. It is not loaded before gunicorn itself, which has already
+# imported ssl (gevent warns about this). The patch also applies to the master
+# (arbiter) process, not only to the workers forked from it.
+if worker_class == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
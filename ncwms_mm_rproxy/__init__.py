@@ -1,15 +1,97 @@
 import os
 import logging.config
+import signal
+from collections import namedtuple
 from time import perf_counter, sleep
 
 from flask import Flask, request, Response
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 import requests
+from sqlalchemy import create_engine
 
-from ncwms_mm_rproxy.translation import Translation
+from ncwms_mm_rproxy.translation import Translation, CoreTranslation
+from ncwms_mm_rproxy.shared_cache import SharedCache
+from ncwms_mm_rproxy.invalidation import InvalidationLog
+from ncwms_mm_rproxy.admin import admin
 
-db = SQLAlchemy()
+
+# Request-rewrite and upstream settings, compiled from the app configuration.
+# Immutable, so that a reload can replace them atomically.
+Settings = namedtuple(
+    "Settings",
+    (
+        "ncwms_url",
+        "dataset_param_names",
+        "excluded_request_headers",
+        "excluded_response_headers",
+        "response_delay",
+    ),
+)
+
+
+def compile_settings(app_config):
+    """
+    Compile request-rewrite and upstream settings from the app configuration.
+
+    :param app_config: (dict-like) Flask app configuration.
+    :return: (Settings)
+    """
+
+    def lower_all(iterable):
+        return map(lambda name: name.lower(), iterable)
+
+    def config(key, type_=frozenset, default=None, process=lower_all):
+        if default is None:
+            default = set()
+        return type_(process(app_config.get(key, default)))
+
+    return Settings(
+        ncwms_url=app_config["NCWMS_URL"],
+        dataset_param_names=(
+            config("NCWMS_LAYER_PARAM_NAMES")
+            | config("NCWMS_DATASET_PARAM_NAMES")
+        ),
+        excluded_request_headers=(
+            config("EXCLUDED_REQUEST_HEADERS") | {"x-forwarded-for"}
+        ),
+        excluded_response_headers=config("EXCLUDED_RESPONSE_HEADERS"),
+        response_delay=app_config.get("RESPONSE_DELAY", None),
+    )
+
+
+def shared_cache_from_config(app_config):
+    """
+    Return the shared translation cache specified by the app configuration,
+    or None if there is none.
+
+    :param app_config: (dict-like) Flask app configuration.
+    :return: (shared_cache.SharedCache)
+    """
+    client = app_config.get("TRANSLATION_SHARED_CACHE", None)
+    if client is None:
+        return None
+    return SharedCache(
+        client,
+        prefix=app_config.get(
+            "TRANSLATION_SHARED_CACHE_PREFIX", "ncwms-mm-rproxy:translation:"
+        ),
+        ttl=app_config.get("TRANSLATION_SHARED_CACHE_TTL", None),
+        backoff=app_config.get("TRANSLATION_SHARED_CACHE_BACKOFF", 5),
+    )
+
+
+def trace_from_config(app_config):
+    """
+    Return a file object to which to write a trace of translation lookups,
+    as specified by the app configuration, or None if there is none.
+
+    :param app_config: (dict-like) Flask app configuration.
+    """
+    path = app_config.get("TRANSLATION_TRACE_FILE", None)
+    if path is None:
+        return None
+    # Line buffered, so that the trace is complete whenever it is read.
+    return open(path.format(pid=os.getpid()), "a", buffering=1)
 
 
 def create_app(test_config=None):
@@ -45,6 +127,7 @@ def create_app(test_config=None):
 
     # Create and configure the Flask app
 
+    time_start = perf_counter()
     app = Flask(__name__)
     CORS(app)
     if test_config is None:
@@ -58,38 +141,166 @@ def create_app(test_config=None):
         # load the test config if passed in
         app.config.from_mapping(test_config)
 
-    ncwms_url = app.config["NCWMS_URL"]
-
-    def lower_all(iterable):
-        return map(lambda name: name.lower(), iterable)
+    settings = compile_settings(app.config)
+    time_configured = perf_counter()
 
-    def config(key, type_=set, default=None, process=lower_all):
-        if default is None:
-            default = set()
-        return type_(process(app.config.get(key, default)))
+    translation_args = dict(
+        cache=app.config.get("TRANSLATION_CACHE", None),
+        shared_cache=shared_cache_from_config(app.config),
+        trace=trace_from_config(app.config),
+    )
+    if app.config.get("LEAN_MODE", False):
+        # Query with SQLAlchemy Core directly on an engine. This avoids
+        # importing Flask-SQLAlchemy, the SQLAlchemy ORM and modelmeta.
+        engine = create_engine(
+            app.config["SQLALCHEMY_DATABASE_URI"],
+            echo=app.config.get("SQLALCHEMY_ECHO", False),
+            **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        )
+        translations = CoreTranslation(engine, **translation_args)
+        time_database = perf_counter()
+        translations.preload()
+    else:
+        from flask_sqlalchemy import SQLAlchemy
+
+        db = SQLAlchemy()
+        db.init_app(app)
+        with app.app_context():
+            engine = db.engine
+            translations = Translation(db.session, **translation_args)
+            time_database = perf_counter()
+            translations.preload()
+    time_preloaded = perf_counter()
+
+    def reload_config():
+        """
+        Reload the app configuration and apply it without restarting.
+        Request-rewrite and upstream settings are recompiled and swapped in
+        atomically. The translation cache is retained, or its contents are
+        migrated if the configured cache type or size has changed.
+        Database configuration is not reloaded.
+        """
+        nonlocal settings
+        if test_config is None:
+            app.config.from_pyfile("flask.config.py", silent=False)
+        new_settings = compile_settings(app.config)
+        translations.set_cache(app.config.get("TRANSLATION_CACHE", None))
+        translations.shared_cache = shared_cache_from_config(app.config)
+        settings = new_settings
+        app.logger.info("Configuration reloaded")
+
+    reload_requested = False
+
+    def request_reload(signum, frame):
+        # Don't do any real work in a signal handler; just flag the reload
+        # and let the next request perform it.
+        nonlocal reload_requested
+        reload_requested = True
+
+    reload_signal = app.config.get("CONFIG_RELOAD_SIGNAL", None)
+    if reload_signal is not None:
+        try:
+            signal.signal(getattr(signal, reload_signal), request_reload)
+        except (AttributeError, ValueError):
+            app.logger.exception(
+                f"Cannot install config reload signal {reload_signal}"
+            )
 
-    dataset_param_names = (
-        config("NCWMS_LAYER_PARAM_NAMES") | config("NCWMS_DATASET_PARAM_NAMES")
+    @app.before_request
+    def reload_if_requested():
+        nonlocal reload_requested
+        if reload_requested:
+            reload_requested = False
+            try:
+                reload_config()
+            except Exception:
+                # Keep serving with the current configuration.
+                app.logger.exception("Configuration reload failure")
+
+    invalidation_log_path = app.config.get("TRANSLATION_INVALIDATION_LOG", None)
+    invalidation_log = (
+        None
+        if invalidation_log_path is None
+        else InvalidationLog(invalidation_log_path)
     )
 
-    excluded_request_headers = config("EXCLUDED_REQUEST_HEADERS") | {
-        "x-forwarded-for"
+    @app.before_request
+    def apply_invalidations():
+        # Apply configuration reloads and invalidations made by other workers.
+        # The worker that made each invalidation has already removed it from
+        # the shared cache.
+        if invalidation_log is None:
+            return
+        try:
+            entries = invalidation_log.poll()
+        except Exception:
+            app.logger.exception("Invalidation log failure")
+            return
+        for entry in entries:
+            try:
+                if entry.get("reload", False):
+                    reload_config()
+                    continue
+                translations.invalidate(
+                    translations.select(
+                        ids=entry.get("ids", ()),
+                        paths=entry.get("paths", ()),
+                        prefixes=entry.get("prefixes", ()),
+                        shared=False,
+                    ),
+                    shared=False,
+                )
+            except Exception:
+                # Keep serving with the current configuration and cache.
+                app.logger.exception(f"Invalidation log entry failure: {entry}")
+
+    def after_fork():
+        """
+        Prepare an app created before forking (e.g., by Gunicorn with
+        `preload_app`) for use in the forked worker process.
+        """
+        # Connections inherited from the parent must not be used by the child;
+        # leave them to the parent, and let the child open its own.
+        engine.dispose(close=False)
+        # The worker may have reset signal handlers.
+        if reload_signal is not None:
+            signal.signal(getattr(signal, reload_signal), request_reload)
+        if translations.trace is not None:
+            # Reopen, so that the trace file name has the worker's pid.
+            translations.trace.close()
+            translations.trace = trace_from_config(app.config)
+
+    app.extensions["ncwms_mm_rproxy"] = {
+        "translations": translations,
+        "reload_config": reload_config,
+        "after_fork": after_fork,
+        "invalidation_log": invalidation_log,
     }
-    excluded_response_headers = config("EXCLUDED_RESPONSE_HEADERS")
-
-    response_delay = app.config.get("RESPONSE_DELAY", None)
-
-    db.init_app(app)
+    app.register_blueprint(admin)
 
-    with app.app_context():
-        translations = Translation(
-            db.session, cache=app.config.get("TRANSLATION_CACHE", None)
-        )
-        translations.preload()
+    startup_timings = {
+        "config": time_configured - time_start,
+        "database": time_database - time_configured,
+        "preload": time_preloaded - time_database,
+        "total": perf_counter() - time_start,
+    }
+    app.extensions["ncwms_mm_rproxy"]["startup_timings"] = startup_timings
+    app.logger.info(
+        "Startup timings: "
+        + ", ".join(f"{name} {time:.3f}s" for name, time in startup_timings.items())
+    )
 
     @app.route("/dynamic/<prefix>", methods=["GET"])
     def dynamic(prefix):
-        nonlocal dataset_param_names
+        # Settings may be replaced by a reload. Use one consistent set of them
+        # for the whole request.
+        (
+            ncwms_url,
+            dataset_param_names,
+            excluded_request_headers,
+            excluded_response_headers,
+            response_delay,
+        ) = settings
         # app.logger.debug(f"Incoming args: {request.args}")
         # app.logger.debug(f"Incoming headers: {request.headers}")
         time_resp_start = perf_counter()
@@ -154,7 +365,9 @@ def create_app(test_config=None):
         app.logger.debug(f"ncWMS response status: {ncwms_response.status_code}")
         app.logger.debug(f"ncWMS response headers: {ncwms_response.headers}")
 
-        if ncwms_response.status_code != 200 and translations.is_cached():
+        if ncwms_response.status_code != 200 and (
+            translations.is_cached() or translations.is_shared()
+        ):
             # Cached translation may have changed. Update translation and retry.
             reload_dataset_params(translations, dataset_param_names, params)
             ncwms_request_params = translate_params(
@@ -235,6 +448,15 @@ def create_app(test_config=None):
     return app
 
 
+def after_fork(app):
+    """
+    Prepare an app created before forking for use in the forked worker
+    process. Call this in every worker, e.g., from Gunicorn's
+    `post_worker_init` hook.
+    """
+    app.extensions["ncwms_mm_rproxy"]["after_fork"]()
+
+
 # This should all be in another module, probably. Oh well.
 
 def translate_params(translations, dataset_param_names, prefix, params):
@@ -251,11 +473,13 @@ def translate_params(translations, dataset_param_names, prefix, params):
         Non dataset parameters are copied unchanged.
     """
     result = params.copy()
-    for name in result:
-        if name.lower() in dataset_param_names:
-            result[name] = translate_dataset_ids(
-                translations, result[name], prefix
-            )
+    names = [name for name in result if name.lower() in dataset_param_names]
+    # Look up all dataset ids in one batch, then translate from the results.
+    translated = translations.get_many(
+        dataset_id for name in names for dataset_id in get_dataset_ids(result[name])
+    )
+    for name in names:
+        result[name] = translate_dataset_ids(translated, result[name], prefix)
     return result
 
 
@@ -269,13 +493,18 @@ def reload_dataset_params(translations, dataset_param_names, params):
         dataset identifiers. Lower case.
     :param params: (dict) Query parameter values.
     """
-    if not translations.is_cached():
+    if not (translations.is_cached() or translations.is_shared()):
         # This is pointless if there is no translation cache.
         return
-    for name in params:
-        if name.lower() in dataset_param_names:
-            for dataset_id in get_dataset_ids(params[name]):
-                translations.fetch(dataset_id)
+    dataset_ids = [
+        dataset_id
+        for name in params
+        if name.lower() in dataset_param_names
+        for dataset_id in get_dataset_ids(params[name])
+    ]
+    if dataset_ids:
+        # All in a single query.
+        translations.fetch_many(dict.fromkeys(dataset_ids))
 
 
 def get_dataset_ids(value, id_sep=",", var_sep="/"):
@@ -298,7 +527,8 @@ def translate_dataset_ids(translations, ids, prefix, id_sep=",", var_sep="/"):
     Handles both pure dataset identifiers and layer identifiers (with variable
     specifier).
 
-    :param translations: (translation.Translation) id to filepath translations.
+    :param translations: (translation.Translation or dict) id to filepath
+        translations.
     :param ids: (str) String containing dataset ids to be translated.
     :param prefix: (str) Dynamic dataset prefix to form dynamic id.
     :param id_sep: (str) String separating multiple id's in string.
@@ -319,7 +549,8 @@ def translate_dataset_id(translations, id_, prefix, var_sep="/"):
     Handles both pure dataset identifiers and layer identifiers (with variable
     specifier).
 
-    :param translations: (translation.Translation) id to filepath translations.
+    :param translations: (translation.Translation or dict) id to filepath
+        translations.
     :param id_: (str) String containing dataset id to be translated.
     :param prefix: (str) Dynamic dataset prefix to form dynamic id.
     :param var_sep: (str) String separating dataset id from variable id
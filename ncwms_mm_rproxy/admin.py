@@ -0,0 +1,212 @@
+"""
+This module provides the administrative API. All endpoints require the
+bearer token configured in `ADMIN_TOKEN`; if no token is configured, the
+administrative API is disabled.
+
+Endpoints act on the worker handling the request. Configuration reloads and
+cache invalidations (including those implied by a refresh) are passed to the
+other workers through the invalidation log, if one is configured.
+"""
+import hmac
+from functools import wraps
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def state():
+    """Return the app state shared with the administrative API."""
+    return current_app.extensions["ncwms_mm_rproxy"]
+
+
+@admin.before_request
+def authenticate():
+    token = current_app.config.get("ADMIN_TOKEN", None)
+    if not token:
+        abort(404)
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(
+        " "
+    )
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        credentials.encode(), token.encode()
+    ):
+        return "Unauthorized", 401, {"WWW-Authenticate": "Bearer"}
+
+
+def json_errors(view):
+    """Report unexpected errors as JSON, with the error message."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.exception(f"Admin request failed: {request.path}")
+            return jsonify(error=str(e)), 500
+
+    return wrapper
+
+
+@admin.route("/reload", methods=["POST"])
+@json_errors
+def reload():
+    """
+    Reload the app configuration in the worker handling this request, and
+    then, if it succeeds, in the other workers.
+    """
+    state()["reload_config"]()
+    broadcast = publish({"reload": True})
+    translations = state()["translations"]
+    cache = translations.cache
+    return jsonify(
+        cache_type=None if cache is None else type(cache).__name__,
+        cache_size=None if cache is None else len(cache),
+        broadcast=broadcast,
+    )
+
+
+def selected_ids(translations, selection):
+    """
+    Return the set of unique_ids selected by a request body.
+
+    :param translations: (translation.Translation)
+    :param selection: (dict) May contain lists "ids", "paths" and "prefixes",
+        selecting entries by unique_id, by filepath, and by filepath prefix.
+    """
+    return translations.select(
+        ids=selection.get("ids", ()),
+        paths=selection.get("paths", ()),
+        prefixes=selection.get("prefixes", ()),
+    )
+
+
+def publish(entry):
+    """
+    Publish an entry to the other workers, if there is an invalidation log.
+
+    :return: (bool) Whether the entry was published.
+    """
+    invalidation_log = state()["invalidation_log"]
+    if invalidation_log is None:
+        return False
+    invalidation_log.publish(entry)
+    return True
+
+
+def publish_invalidation(selection, unique_ids):
+    """
+    Publish an invalidation to the other workers. Other workers resolve paths
+    and prefixes against their own caches; the unique_ids resolved by this
+    worker are included as well.
+    """
+    publish(
+        {
+            "ids": sorted(set(selection.get("ids", ())) | set(unique_ids)),
+            "paths": selection.get("paths", []),
+            "prefixes": selection.get("prefixes", []),
+        }
+    )
+
+
+selection_keys = ("ids", "paths", "prefixes")
+
+
+def selection():
+    """
+    Return the request body selecting cache entries, or abort if it is not
+    an object whose "ids", "paths" and "prefixes" (each optional, at least
+    one non-empty) are lists of strings.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, "Body must be a JSON object")
+    for key in selection_keys:
+        value = body.get(key, [])
+        if not isinstance(value, list) or not all(
+            isinstance(item, str) for item in value
+        ):
+            abort(400, f'"{key}" must be a list of strings')
+    if not any(body.get(key) for key in selection_keys):
+        abort(400, 'Body must select entries by "ids", "paths" or "prefixes"')
+    return body
+
+
+@admin.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(state()["translations"].stats())
+
+
+@admin.route("/cache/entries", methods=["GET"])
+def cache_entries():
+    """
+    Dump cache entries, optionally only those whose filepath starts with the
+    query parameter `prefix`. At most `limit` (default 1000) entries are
+    returned.
+    """
+    translations = state()["translations"]
+    prefix = request.args.get("prefix", None)
+    limit = request.args.get("limit", 1000, type=int)
+    if prefix is None:
+        entries = translations.entries()
+    else:
+        entries = [
+            (unique_id, translations.peek(unique_id))
+            for unique_id in sorted(translations.ids_for_prefix(prefix))
+        ]
+    return jsonify(
+        total=len(entries),
+        entries=dict(entries[:limit]),
+    )
+
+
+@admin.route("/cache/entries/<unique_id>", methods=["GET"])
+def cache_entry(unique_id):
+    filepath = state()["translations"].peek(unique_id)
+    if filepath is None:
+        abort(404, f"Dataset id '{unique_id}' is not cached.")
+    return jsonify(unique_id=unique_id, filepath=filepath)
+
+
+@admin.route("/cache/entries/<unique_id>", methods=["DELETE"])
+@json_errors
+def cache_entry_invalidate(unique_id):
+    invalidated = state()["translations"].invalidate([unique_id])
+    publish_invalidation({"ids": [unique_id]}, [])
+    return jsonify(invalidated=invalidated)
+
+
+@admin.route("/cache/invalidate", methods=["POST"])
+@json_errors
+def cache_invalidate():
+    """
+    Invalidate cache entries selected by unique_id, filepath, or filepath
+    prefix.
+    """
+    translations = state()["translations"]
+    body = selection()
+    unique_ids = selected_ids(translations, body)
+    invalidated = translations.invalidate(unique_ids)
+    publish_invalidation(body, unique_ids)
+    return jsonify(invalidated=sorted(invalidated))
+
+
+@admin.route("/cache/refresh", methods=["POST"])
+@json_errors
+def cache_refresh():
+    """
+    Fetch anew from the database the translations selected by unique_id,
+    filepath, or filepath prefix. Selected ids need not already be cached.
+    """
+    translations = state()["translations"]
+    body = selection()
+    unique_ids = selected_ids(translations, body)
+    refreshed, failed = translations.refresh(sorted(unique_ids))
+    # Other workers drop the selected translations, and so fetch them anew
+    # (from the shared cache, if any, which now has the refreshed ones).
+    publish_invalidation(body, unique_ids)
+    return jsonify(refreshed=refreshed, failed=failed)
@@ -22,6 +22,9 @@ SQLALCHEMY_ENGINE_OPTIONS = dict(
 # Translation app configuration
 # See README for explanations.
 
+# Note: setting via env var.
+LEAN_MODE = os.getenv("LEAN_MODE", "false").lower() == "true"
+
 NCWMS_URL = os.getenv(
     "NCWMS_URL", "https://services.pacificclimate.org/dev/ncwms"
 )
@@ -32,3 +35,35 @@ EXCLUDED_REQUEST_HEADERS = {"host", "x-forwarded-for"}
 EXCLUDED_RESPONSE_HEADERS = set()
 
 TRANSLATION_CACHE = dict()
+
+# Shared translation cache, in a store speaking the Redis protocol.
+# Requires the `redis` package (extra "shared-cache").
+# Note: setting via env var.
+TRANSLATION_SHARED_CACHE_URL = os.getenv("TRANSLATION_SHARED_CACHE_URL", None)
+TRANSLATION_SHARED_CACHE_TIMEOUT = float(
+    os.getenv("TRANSLATION_SHARED_CACHE_TIMEOUT", "0.5")
+)
+if TRANSLATION_SHARED_CACHE_URL:
+    import redis
+
+    TRANSLATION_SHARED_CACHE = redis.Redis.from_url(
+        TRANSLATION_SHARED_CACHE_URL,
+        socket_timeout=TRANSLATION_SHARED_CACHE_TIMEOUT,
+        socket_connect_timeout=TRANSLATION_SHARED_CACHE_TIMEOUT,
+    )
+else:
+    TRANSLATION_SHARED_CACHE = None
+TRANSLATION_SHARED_CACHE_TTL = 24 * 60 * 60
+TRANSLATION_SHARED_CACHE_BACKOFF = 5
+
+# Log through which cache invalidations reach all workers.
+TRANSLATION_INVALIDATION_LOG = "/tmp/ncwms-mm-rproxy-invalidations.log"
+
+# Trace of translation lookups, for replay against candidate caches.
+TRANSLATION_TRACE_FILE = None
+
+# Administrative API and configuration reloading
+
+# Note: setting via env var.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", None)
+CONFIG_RELOAD_SIGNAL = None
@@ -0,0 +1,90 @@
+"""
+This module provides a log of cache invalidations, through which an
+invalidation made by one worker process reaches all the others. Configuration
+reloads reach all workers the same way.
+
+The log is a file of JSON lines, one per invalidation or reload, shared by all
+the worker processes of an instance. A worker appends an entry when it
+invalidates translations or reloads the configuration (via the administrative
+API), and every worker
+polls the log before handling each request, applying any entries appended by
+other workers since it last looked. Polling costs one `stat` of the log file
+unless there is something new.
+"""
+import json
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationLog:
+    def __init__(self, path):
+        """
+        Constructor. Entries already in the log are not applied.
+
+        :param path: (str) Path of log file. Created if it does not exist.
+        """
+        self.path = path
+        self.offset = self.size()
+        # End offsets of entries published through this object, which need
+        # not be applied again when polling.
+        self.published = set()
+
+    def size(self):
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def publish(self, entry):
+        """
+        Append an entry to the log.
+
+        :param entry: (dict) Either `{"reload": True}`, for a configuration
+            reload, or a selection of translations to invalidate, with
+            optional lists "ids", "paths" and "prefixes" (see
+            Translation.select).
+        """
+        line = (json.dumps(entry) + "\n").encode()
+        # A single write to a file opened for appending, so that entries
+        # written concurrently by several workers are not interleaved.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            self.published.add(os.lseek(fd, 0, os.SEEK_CUR))
+        finally:
+            os.close(fd)
+
+    def poll(self):
+        """
+        Return the entries appended to the log by others since the last
+        poll.
+        """
+        size = self.size()
+        if size == self.offset:
+            return []
+        if size < self.offset:
+            # The log has been truncated or replaced; start again.
+            logger.warning(f"Invalidation log {self.path} truncated")
+            self.offset = 0
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        selections = []
+        position = self.offset
+        # Leave any incomplete last line for the next poll.
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            position += len(line)
+            if position in self.published:
+                self.published.discard(position)
+                continue
+            try:
+                selections.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Invalid invalidation log entry: {line!r}")
+        self.offset = position
+        return selections
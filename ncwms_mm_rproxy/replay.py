@@ -0,0 +1,128 @@
+"""
+This module replays a recorded trace of translation lookups (see
+`TRANSLATION_TRACE_FILE`) against several cache policies and sizes, and
+reports the hit rate of each, as a basis for choosing `TRANSLATION_CACHE`.
+
+Usage:
+
+    python -m ncwms_mm_rproxy.replay TRACE ... [--sizes N ...] [--policies P ...]
+"""
+import argparse
+import sys
+from itertools import chain
+
+from cachetools import LFUCache, LRUCache, RRCache
+
+from ncwms_mm_rproxy.tinylfu import TinyLFUCache
+
+
+# Cache factories, by policy name. Each takes the cache size.
+policies = {
+    "lru": LRUCache,
+    "lfu": LFUCache,
+    "rr": RRCache,
+    "tinylfu": TinyLFUCache,
+}
+
+
+def read_trace(lines):
+    """Return the keys in a trace, one per non-blank line."""
+    return [key for key in (line.strip() for line in lines) if key]
+
+
+def replay(trace, cache):
+    """
+    Replay a trace of keys against a cache, as Translation uses it: a miss is
+    followed by storing the key.
+
+    :param trace: (iterable) Keys looked up.
+    :param cache: Cache object.
+    :return: (tuple) Number of hits, number of lookups.
+    """
+    hits = lookups = 0
+    for key in trace:
+        lookups += 1
+        try:
+            cache[key]
+            hits += 1
+        except KeyError:
+            cache[key] = key
+    return hits, lookups
+
+
+def compare(trace, sizes, policy_names=tuple(policies)):
+    """
+    Replay a trace against each combination of policy and size.
+
+    :param trace: (list) Keys looked up.
+    :param sizes: (iterable) Cache sizes.
+    :param policy_names: (iterable) Names of policies (keys of `policies`).
+    :return: (list) Rows (policy name, size, hit rate). The first row is for
+        an unbounded `dict` cache, whose hit rate is the best possible.
+    """
+    hits, lookups = replay(trace, {})
+    rows = [("dict", None, hits / lookups if lookups else 0.0)]
+    for name in policy_names:
+        for size in sizes:
+            hits, lookups = replay(trace, policies[name](size))
+            rows.append((name, size, hits / lookups if lookups else 0.0))
+    return rows
+
+
+def cache_size(value):
+    """Argument type for cache sizes: a positive integer."""
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise argparse.ArgumentTypeError(
+            f"invalid cache size: {value!r} (must be a positive integer)"
+        )
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a translation lookup trace against cache policies "
+        "and sizes, and report hit rates."
+    )
+    parser.add_argument(
+        "traces",
+        nargs="+",
+        metavar="TRACE",
+        help="Trace file(s), one unique_id per line. Multiple files "
+        "(e.g., one per worker) are replayed one after another. "
+        "Use - for standard input.",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=cache_size,
+        default=[1000, 10000, 100000],
+        help="Cache sizes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        choices=list(policies),
+        default=list(policies),
+        help="Cache policies (default: all)",
+    )
+    args = parser.parse_args(argv)
+
+    def lines(path):
+        if path == "-":
+            return sys.stdin.readlines()
+        with open(path) as file:
+            return file.readlines()
+
+    trace = read_trace(chain.from_iterable(lines(path) for path in args.traces))
+    print(f"{len(trace)} lookups, {len(set(trace))} distinct keys")
+    print(f"{'policy':<10}{'size':>10}{'hit rate':>10}")
+    for name, size, hit_rate in compare(trace, args.sizes, args.policies):
+        print(f"{name:<10}{'-' if size is None else size:>10}{hit_rate:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+This module provides a translation cache shared between workers and
+instances of this service, held in an external store speaking the Redis
+protocol (Redis, Valkey, KeyDB, etc.).
+
+Besides the translations, the store holds an index of them by filepath: a set
+of unique_ids per filepath, so that translations can be selected by filepath
+or filepath prefix across all workers and instances. Sets are not pruned when
+translations are invalidated or expire; a stale member selects at most a
+translation that is no longer cached. Sets expire with the translations added
+to them last.
+
+The store is accessed through a client object with the interface of
+`redis.Redis` (of which only `mget`, `pipeline`, `delete` and `scan_iter`
+are used). A failure to reach the store is logged and treated as a cache miss,
+so that translation falls back to the database. After a failure, lookups and
+writes skip the store for a short while (`backoff`), so that an outage costs
+neither a connection attempt nor a log message per request. Invalidations,
+which are rare and which it matters to apply, are always attempted.
+"""
+import logging
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    def __init__(
+        self, client, prefix="ncwms-mm-rproxy:translation:", ttl=None, backoff=5
+    ):
+        """
+        Constructor.
+
+        :param client: Redis client, e.g., `redis.Redis.from_url(url)`.
+        :param prefix: (str) Prefix of keys in the store, to separate
+            translations from any other data in it.
+        :param ttl: (int) Lifetime in seconds of cached translations, or None
+            for no expiry.
+        :param backoff: (float) Time in seconds for which to skip lookups and
+            writes after a failure to reach the store.
+        """
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.backoff = backoff
+        # Lookups and writes skip the store until this time.
+        self.skip_until = 0.0
+
+    def available(self):
+        """Return True unless backing off after a failure."""
+        return time.monotonic() >= self.skip_until
+
+    def failed(self, operation, error):
+        """
+        Record and log a failure to reach the store, and start backing off.
+        """
+        if self.available():
+            logger.warning(
+                f"Shared cache {operation} failed, skipping it for "
+                f"{self.backoff}s: {error!r}"
+            )
+        self.skip_until = time.monotonic() + self.backoff
+
+    def key(self, unique_id):
+        return f"{self.prefix}{unique_id}"
+
+    def path_key(self, filepath):
+        return f"{self.prefix}paths:{filepath}"
+
+    def get_many(self, unique_ids):
+        """
+        Return a dict of the cached filepaths for unique_ids, in a single
+        round trip. unique_ids not in the store are omitted.
+        """
+        unique_ids = list(unique_ids)
+        if not unique_ids or not self.available():
+            return {}
+        try:
+            values = self.client.mget([self.key(id_) for id_ in unique_ids])
+        except Exception as error:
+            self.failed("get", error)
+            return {}
+        return {
+            unique_id: value.decode() if isinstance(value, bytes) else value
+            for unique_id, value in zip(unique_ids, values)
+            if value is not None
+        }
+
+    def set_many(self, translations):
+        """
+        Store translations (a dict of unique_id -> filepath), pipelined in a
+        single round trip.
+        """
+        if not translations or not self.available():
+            return
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for unique_id, filepath in translations.items():
+                pipeline.set(self.key(unique_id), filepath, ex=self.ttl)
+                pipeline.sadd(self.path_key(filepath), unique_id)
+                if self.ttl is not None:
+                    pipeline.expire(self.path_key(filepath), self.ttl)
+            pipeline.execute()
+        except Exception as error:
+            self.failed("set", error)
+
+    def delete_many(self, unique_ids):
+        """Remove translations for unique_ids."""
+        keys = [self.key(unique_id) for unique_id in unique_ids]
+        if not keys:
+            return
+        try:
+            self.client.delete(*keys)
+        except Exception as error:
+            self.failed("delete", error)
+
+    def ids_for_paths(self, filepaths):
+        """
+        Return the set of unique_ids indexed under filepaths, in a single
+        round trip.
+        """
+        return self.members([self.path_key(filepath) for filepath in filepaths])
+
+    def ids_for_prefixes(self, prefixes):
+        """
+        Return the set of unique_ids indexed under filepaths starting with
+        any of prefixes. This scans the keys of the store, so is slow on a
+        large store.
+        """
+        keys = set()
+        try:
+            for prefix in prefixes:
+                pattern = re.sub(r"([\\*?\[\]])", r"\\\1", self.path_key(prefix))
+                keys.update(self.client.scan_iter(match=f"{pattern}*", count=1000))
+        except Exception as error:
+            self.failed("scan", error)
+            return set()
+        return self.members(keys)
+
+    def members(self, keys):
+        """Return the union of the index sets at keys."""
+        keys = list(keys)
+        if not keys:
+            return set()
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.smembers(key)
+            results = pipeline.execute()
+        except Exception as error:
+            self.failed("index get", error)
+            return set()
+        return {
+            member.decode() if isinstance(member, bytes) else member
+            for members in results
+            for member in members
+        }
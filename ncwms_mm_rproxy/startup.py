@@ -0,0 +1,116 @@
+"""
+This module reports where the time goes when a worker starts: the time to
+import this package, broken down by the modules it imports, and the time
+spent in each phase of `create_app` (loading configuration, setting up the
+database, preloading the translation cache).
+
+Usage:
+
+    python -m ncwms_mm_rproxy.startup [--top N] [--no-app]
+
+Creating the app uses the configuration in `flask.config.py`, and so requires
+the database it specifies. Use `--no-app` to report import times only.
+"""
+import argparse
+import subprocess
+import sys
+
+
+def import_times(module="ncwms_mm_rproxy"):
+    """
+    Import module in a fresh interpreter, and return the import times
+    reported by `python -X importtime`.
+
+    :return: (list) Tuples (module name, self time, cumulative time, depth),
+        times in seconds, in the order reported. Depth 1 modules are imported
+        directly by module (or are module itself).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in completed.stderr.splitlines():
+        # Lines have the form
+        # "import time:   self [us] | cumulative | imported package",
+        # with the package name indented by two spaces per level of nesting.
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        try:
+            self_time, cumulative = int(self_us) / 1e6, int(cumulative_us) / 1e6
+        except ValueError:
+            # Header line.
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), self_time, cumulative, depth))
+    return times
+
+
+def top_level_import_times(times, module="ncwms_mm_rproxy"):
+    """
+    Return the cumulative import time of each top-level package imported by
+    module, largest first. A package's time includes that of everything it
+    imports that was not already imported. Modules imported at interpreter
+    startup, before module, are not counted.
+    """
+    # A module is reported after the modules it imports, so module's subtree
+    # is the run of deeper entries immediately before it.
+    end = next(
+        i
+        for i, (name, _, _, depth) in enumerate(times)
+        if name == module and depth == 0
+    )
+    start = end
+    while start > 0 and times[start - 1][3] > 0:
+        start -= 1
+    totals = {}
+    for name, _, cumulative, depth in times[start:end]:
+        if depth == 1:
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0) + cumulative
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report worker startup times.")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="Number of top-level packages to report (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-app",
+        action="store_true",
+        help="Don't create the app; report import times only.",
+    )
+    args = parser.parse_args(argv)
+
+    times = import_times()
+    total = next(
+        cumulative
+        for name, _, cumulative, depth in times
+        if name == "ncwms_mm_rproxy" and depth == 0
+    )
+    print(f"Import time, ncwms_mm_rproxy: {total:.3f}s")
+    print(f"{'package':<30}{'cumulative':>12}")
+    for package, cumulative in top_level_import_times(times)[: args.top]:
+        print(f"{package:<30}{cumulative:>11.3f}s")
+
+    if args.no_app:
+        return
+    from ncwms_mm_rproxy import create_app
+
+    app = create_app()
+    print()
+    print(f"create_app, LEAN_MODE={app.config.get('LEAN_MODE', False)}:")
+    timings = app.extensions["ncwms_mm_rproxy"]["startup_timings"]
+    for phase, time in timings.items():
+        print(f"{phase:<30}{time:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+This module provides a scan-resistant translation cache, `TinyLFUCache`,
+which decides whether to admit new entries by comparing their estimated
+frequency of access with that of the entries they would displace.
+
+Access frequencies are estimated with `FrequencySketch`, a count-min sketch
+whose counters are periodically halved so that estimates track recent,
+rather than all-time, popularity. A "doorkeeper" Bloom filter in front of the
+sketch absorbs the first access of each key, so that keys accessed only once
+(e.g., by a scan) do not inflate the counts of others.
+
+The cache structure follows W-TinyLFU (Einziger, Friedman and Manes,
+"TinyLFU: A Highly Efficient Cache Admission Policy"): a small LRU window
+admits new entries, and entries evicted from the window compete with the
+least recently used entries of a main segmented LRU cache for a place in it.
+"""
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+# Translation table for bytes.translate that halves each byte.
+HALVE = bytes(count >> 1 for count in range(256))
+
+# Odd 64-bit multipliers, one per hash function. Indexes are taken from the
+# high bits of the product of a key's hash and a multiplier.
+SEEDS = (
+    0x9E3779B97F4A7C15,
+    0xC2B2AE3D27D4EB4F,
+    0x165667B19E3779F9,
+    0xD6E8FEB86659FD93,
+    0xFF51AFD7ED558CCD,
+    0xC4CEB9FE1A85EC53,
+)
+MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    def __init__(self, width, depth=4, max_count=15):
+        """
+        Constructor.
+
+        :param width: (int) Number of counters per row. Rounded up to a power
+            of 2. Should be about the number of distinct keys to be
+            distinguished, e.g., the cache size.
+        :param depth: (int) Number of rows (hash functions).
+        :param max_count: (int) Counters saturate at this value. The maximum
+            estimate is one more, counting the access held by the doorkeeper.
+        """
+        self.width = 1 << max(0, int(width) - 1).bit_length()
+        self.depth = min(depth, len(SEEDS) - 2)
+        self.max_count = max_count
+        self.table = bytearray(self.width * self.depth)
+        # Doorkeeper Bloom filter, one bit per counter in the table.
+        self.doorkeeper = bytearray(self.width * self.depth)
+        # Halve all counters after this many increments.
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    @staticmethod
+    def hashes(key, seeds, size):
+        """Return a hash of key in range(size) (a power of 2) per seed."""
+        h = hash(key) & MASK64
+        shift = 64 - (size.bit_length() - 1)
+        return [((h * seed) & MASK64) >> shift for seed in seeds]
+
+    def indexes(self, key):
+        return [
+            row * self.width + index
+            for row, index in enumerate(
+                self.hashes(key, SEEDS[: self.depth], self.width)
+            )
+        ]
+
+    def doorkeeper_bits(self, key):
+        return [
+            (bit >> 3, 1 << (bit & 7))
+            for bit in self.hashes(key, SEEDS[-2:], 8 * len(self.doorkeeper))
+        ]
+
+    def estimate(self, key):
+        """Return the estimated (recent) frequency of access of key."""
+        in_doorkeeper = all(
+            self.doorkeeper[byte] & mask for byte, mask in self.doorkeeper_bits(key)
+        )
+        return in_doorkeeper + min(self.table[i] for i in self.indexes(key))
+
+    def increment(self, key):
+        """Record an access of key."""
+        bits = self.doorkeeper_bits(key)
+        if not all(self.doorkeeper[byte] & mask for byte, mask in bits):
+            for byte, mask in bits:
+                self.doorkeeper[byte] |= mask
+            self.added()
+            return
+        indexes = self.indexes(key)
+        count = min(self.table[i] for i in indexes)
+        if count >= self.max_count:
+            return
+        # Conservative update: only the counters at the minimum are
+        # incremented, which reduces overestimation.
+        for i in indexes:
+            if self.table[i] == count:
+                self.table[i] = count + 1
+        self.added()
+
+    def added(self):
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.age()
+
+    def age(self):
+        """
+        Halve all counters and clear the doorkeeper, so that old accesses
+        count for less.
+        """
+        self.table = self.table.translate(HALVE)
+        self.doorkeeper = bytearray(len(self.doorkeeper))
+        self.additions //= 2
+
+
+class TinyLFUCache(MutableMapping):
+    def __init__(self, maxsize, window=0.01, protected=0.8):
+        """
+        Constructor.
+
+        :param maxsize: (int) Maximum number of entries.
+        :param window: (float) Fraction of maxsize given to the admission
+            window.
+        :param protected: (float) Fraction of the main cache given to
+            entries accessed more than once since admission.
+        """
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, not {maxsize}")
+        self.maxsize = maxsize
+        self.window_maxsize = max(1, int(maxsize * window))
+        self.main_maxsize = max(0, maxsize - self.window_maxsize)
+        self.protected_maxsize = int(self.main_maxsize * protected)
+        self.window = OrderedDict()
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.sketch = FrequencySketch(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(maxsize={self.maxsize}, "
+            f"currsize={self.currsize}, hit_rate={self.hit_rate:.3f})"
+        )
+
+    @property
+    def currsize(self):
+        return len(self)
+
+    @property
+    def hit_rate(self):
+        """Fraction of lookups that were hits, or 0 if none yet."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def segment(self, key):
+        for segment in (self.window, self.probation, self.protected):
+            if key in segment:
+                return segment
+        return None
+
+    def peek(self, key):
+        """
+        Return the value for key without recording an access.
+        Raise KeyError if key is not cached.
+        """
+        segment = self.segment(key)
+        if segment is None:
+            raise KeyError(key)
+        return segment[key]
+
+    def __getitem__(self, key):
+        self.sketch.increment(key)
+        if key in self.window:
+            self.window.move_to_end(key)
+        elif key in self.protected:
+            self.protected.move_to_end(key)
+        elif key in self.probation:
+            # Accessed again since admission: promote to protected, demoting
+            # the least recently used protected entry if necessary.
+            self.protected[key] = self.probation.pop(key)
+            if len(self.protected) > self.protected_maxsize:
+                demoted, value = self.protected.popitem(last=False)
+                self.probation[demoted] = value
+        else:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return self.segment(key)[key]
+
+    def __setitem__(self, key, value):
+        segment = self.segment(key)
+        if segment is not None:
+            segment[key] = value
+            return
+        self.window[key] = value
+        if len(self.window) > self.window_maxsize:
+            self.admit(*self.window.popitem(last=False))
+
+    def admit(self, candidate, value):
+        """
+        Move candidate, evicted from the window, into the main cache if there
+        is room, or if it is accessed more frequently than the entry it would
+        evict. Otherwise discard it.
+        """
+        if len(self.probation) + len(self.protected) < self.main_maxsize:
+            self.probation[candidate] = value
+            return
+        segment = self.probation or self.protected
+        if not segment:
+            return
+        victim = next(iter(segment))
+        if self.sketch.estimate(candidate) > self.sketch.estimate(victim):
+            del segment[victim]
+            self.probation[candidate] = value
+
+    def __delitem__(self, key):
+        segment = self.segment(key)
+        if segment is None:
+            raise KeyError(key)
+        del segment[key]
+
+    def __contains__(self, key):
+        return self.segment(key) is not None
+
+    def __iter__(self):
+        yield from list(self.window)
+        yield from list(self.probation)
+        yield from list(self.protected)
+
+    def __len__(self):
+        return len(self.window) + len(self.probation) + len(self.protected)
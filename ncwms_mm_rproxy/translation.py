@@ -2,40 +2,330 @@
 This module provides translation of modelmeta unique_id to filepath,
 with caching, and the option to reload (query the database anew) for a
 unique_id that is already cached.
+
+Optionally, translations are also cached in a store shared with other
+workers and instances (see `shared_cache`). Lookups then go to the local
+cache, then the shared cache, then the database, and results are written back
+to both caches.
+
+When caching, a reverse index from filepath to the unique_ids cached for it
+is maintained, so that cached translations can be found (and invalidated)
+by filepath or filepath prefix.
 """
 import logging
-from modelmeta import DataFile
-from sqlalchemy.orm.exc import MultipleResultsFound
+from cachetools import Cache
+from sqlalchemy import Column, MetaData, String, Table, bindparam, select
+from sqlalchemy.exc import MultipleResultsFound
 
 
 logger = logging.getLogger(__name__)
 
 
 class Translation:
-    def __init__(self, session, cache=None):
+    def __init__(self, session, cache=None, shared_cache=None, trace=None):
         """
         Constructor.
 
         :param session: SQLAlchemy session for modelmeta database
         :param cache: If None, don't cache. Otherwise use this object as
             the cache.
+        :param shared_cache: (shared_cache.SharedCache) If None, don't use
+            a shared cache. Otherwise consult it on local cache misses.
+        :param trace: If None, don't record a trace. Otherwise write each
+            unique_id looked up, one per line, to this file object. Such a
+            trace can be replayed with `ncwms_mm_rproxy.replay`.
         """
         self.session = session
         self.cache = cache
+        self.shared_cache = shared_cache
+        self.trace = trace
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        # Reverse index: filepath -> set of unique_ids cached for it.
+        # `indexed` records the unique_id -> filepath mappings the reverse
+        # index holds. Caches may evict entries without telling us, so these
+        # can hold entries no longer in the cache; such entries are ignored on
+        # lookup and pruned periodically.
+        self.index = {}
+        self.indexed = {}
+        self.rebuild_index()
 
     def is_cached(self):
         return self.cache is not None
 
-    def get(self, unique_id):
-        """Return the filepath corresponding to unique_id."""
+    def is_shared(self):
+        return self.shared_cache is not None
+
+    def peek(self, unique_id):
+        """
+        Return the cached filepath for unique_id, or None if not cached,
+        without counting as an access for the cache's eviction policy.
+        """
         if not self.is_cached():
-            return self.fetch(unique_id)
+            return None
         try:
-            logger.debug(f"Cache hit: {unique_id}")
+            if hasattr(self.cache, "peek"):
+                return self.cache.peek(unique_id)
+            if isinstance(self.cache, Cache):
+                return Cache.__getitem__(self.cache, unique_id)
             return self.cache[unique_id]
         except KeyError:
-            logger.debug(f"Cache miss: {unique_id}")
-            return self.fetch(unique_id)
+            return None
+
+    def entries(self):
+        """Return a list of the (unique_id, filepath) pairs in the cache."""
+        if not self.is_cached():
+            return []
+        return [
+            (unique_id, filepath)
+            for unique_id in list(self.cache)
+            if (filepath := self.peek(unique_id)) is not None
+        ]
+
+    def index_add(self, unique_id, filepath):
+        self.index_remove(unique_id)
+        self.index.setdefault(filepath, set()).add(unique_id)
+        self.indexed[unique_id] = filepath
+
+    def index_remove(self, unique_id):
+        filepath = self.indexed.pop(unique_id, None)
+        if filepath is None:
+            return
+        unique_ids = self.index.get(filepath)
+        if unique_ids is not None:
+            unique_ids.discard(unique_id)
+            if not unique_ids:
+                del self.index[filepath]
+
+    def prune_index(self):
+        """Remove index entries for unique_ids no longer in the cache."""
+        for unique_id in [
+            unique_id for unique_id in self.indexed if unique_id not in self.cache
+        ]:
+            self.index_remove(unique_id)
+
+    def rebuild_index(self):
+        """
+        Rebuild the reverse index from the cache contents. Necessary only if
+        the cache has been modified other than through this object.
+        """
+        self.index = {}
+        self.indexed = {}
+        for unique_id, filepath in self.entries():
+            self.index_add(unique_id, filepath)
+
+    def cache_put(self, unique_id, filepath):
+        """Cache a translation and index it."""
+        self.cache[unique_id] = filepath
+        self.index_add(unique_id, filepath)
+        # Prune evicted entries once they make up most of the index. This
+        # keeps the amortized cost of pruning constant per insertion.
+        if len(self.indexed) > 2 * len(self.cache) + 1000:
+            self.prune_index()
+
+    def ids_for_path(self, filepath):
+        """Return the set of cached unique_ids that translate to filepath."""
+        return {
+            unique_id
+            for unique_id in self.index.get(filepath, ())
+            if unique_id in self.cache
+        }
+
+    def ids_for_prefix(self, prefix):
+        """
+        Return the set of cached unique_ids whose filepath starts with prefix
+        (e.g., a directory path). This scans all distinct cached filepaths.
+        """
+        return {
+            unique_id
+            for filepath, unique_ids in self.index.items()
+            if filepath.startswith(prefix)
+            for unique_id in unique_ids
+            if unique_id in self.cache
+        }
+
+    def select(self, ids=(), paths=(), prefixes=(), shared=True):
+        """
+        Return the set of unique_ids selected by unique_id, by filepath, or by
+        filepath prefix. Filepaths and prefixes select cached unique_ids.
+
+        :param ids: Iterable of unique_ids.
+        :param paths: Iterable of filepaths.
+        :param prefixes: Iterable of filepath prefixes.
+        :param shared: (bool) If True, filepaths and prefixes also select
+            unique_ids in the shared cache, if any, via its filepath index.
+        """
+        paths = list(paths)
+        prefixes = list(prefixes)
+        unique_ids = set(ids)
+        for filepath in paths:
+            unique_ids |= self.ids_for_path(filepath)
+        for prefix in prefixes:
+            unique_ids |= self.ids_for_prefix(prefix)
+        if shared and self.is_shared():
+            unique_ids |= self.shared_cache.ids_for_paths(paths)
+            if prefixes:
+                unique_ids |= self.shared_cache.ids_for_prefixes(prefixes)
+        return unique_ids
+
+    def invalidate(self, unique_ids, shared=True):
+        """
+        Remove translations from the cache, and from the shared cache if any.
+
+        :param unique_ids: Iterable of unique_ids.
+        :param shared: (bool) If False, leave the shared cache alone (e.g.,
+            because another process has already invalidated it).
+        :return: (list) unique_ids that were cached locally and have been
+            removed.
+        """
+        unique_ids = list(unique_ids)
+        if shared and self.is_shared():
+            self.shared_cache.delete_many(unique_ids)
+        if not self.is_cached():
+            return []
+        removed = []
+        for unique_id in unique_ids:
+            try:
+                del self.cache[unique_id]
+                removed.append(unique_id)
+            except KeyError:
+                pass
+            self.index_remove(unique_id)
+        logger.info(f"Cache invalidate: {len(removed)} items")
+        return removed
+
+    def refresh(self, unique_ids):
+        """
+        Fetch translations anew from the database, in a single query,
+        updating the cache and the shared cache. unique_ids no longer in the
+        database, or with multiple matches, are removed from both.
+
+        :param unique_ids: Iterable of unique_ids.
+        :return: (tuple) dict of refreshed unique_id -> filepath, and list of
+            unique_ids that could not be translated.
+        """
+        unique_ids = list(dict.fromkeys(unique_ids))
+        if not unique_ids:
+            return {}, []
+        logger.debug(f"Translation refresh: {len(unique_ids)} items")
+        refreshed, _ = self.store_rows(self.query_filepaths(unique_ids))
+        # Not found, or with multiple matches.
+        failed = [unique_id for unique_id in unique_ids if unique_id not in refreshed]
+        self.invalidate(failed)
+        return refreshed, failed
+
+    def stats(self):
+        """Return a dict of cache statistics."""
+        return {
+            "cached": self.is_cached(),
+            "type": type(self.cache).__name__ if self.is_cached() else None,
+            "size": len(self.cache) if self.is_cached() else 0,
+            "maxsize": getattr(self.cache, "maxsize", None),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (
+                self.hits / (self.hits + self.misses)
+                if self.hits + self.misses
+                else None
+            ),
+            "shared": self.is_shared(),
+            "shared_hits": self.shared_hits,
+            "indexed_paths": len(self.index),
+        }
+
+    def set_cache(self, cache):
+        """
+        Replace the cache, retaining existing cache contents where possible.
+
+        If the new cache is of the same type and size as the current one,
+        the current cache (and its contents) is kept and `cache` is discarded.
+        Otherwise existing entries are copied into `cache` (subject to its
+        own size limit and eviction policy) before it replaces the current
+        cache. Entries already present in `cache` are not overwritten.
+
+        :param cache: New cache object, or None for no caching.
+        :return: The cache object now in use.
+        """
+        old_cache = self.cache
+        if cache is None or old_cache is None:
+            self.cache = cache
+            self.rebuild_index()
+        elif cache is old_cache or (
+            type(cache) is type(old_cache)
+            and getattr(cache, "maxsize", None)
+            == getattr(old_cache, "maxsize", None)
+        ):
+            logger.info("Cache replace: same type and size; cache retained")
+        else:
+            for unique_id, filepath in list(old_cache.items()):
+                if unique_id not in cache:
+                    cache[unique_id] = filepath
+            # A single assignment, so concurrent readers see either the old
+            # or the new cache, never a partially migrated one.
+            self.cache = cache
+            self.rebuild_index()
+            logger.info(
+                f"Cache replace: migrated {len(cache)} of "
+                f"{len(old_cache)} items to {type(cache).__name__}"
+            )
+        return self.cache
+
+    def get(self, unique_id):
+        """Return the filepath corresponding to unique_id."""
+        if self.trace is not None:
+            self.trace.write(f"{unique_id}\n")
+        if self.is_cached():
+            try:
+                logger.debug(f"Cache hit: {unique_id}")
+                filepath = self.cache[unique_id]
+                self.hits += 1
+                return filepath
+            except KeyError:
+                logger.debug(f"Cache miss: {unique_id}")
+                self.misses += 1
+        if self.is_shared():
+            filepath = self.shared_cache.get_many([unique_id]).get(unique_id)
+            if filepath is not None:
+                logger.debug(f"Shared cache hit: {unique_id}")
+                self.shared_hits += 1
+                if self.is_cached():
+                    self.cache_put(unique_id, filepath)
+                return filepath
+        return self.fetch(unique_id)
+
+    def get_many(self, unique_ids):
+        """
+        Return a dict of the filepaths corresponding to unique_ids.
+        Each tier (local cache, shared cache, database) is consulted once for
+        all the unique_ids missing from the tiers before it.
+        """
+        unique_ids = list(dict.fromkeys(unique_ids))
+        # Trace lookups as made: one per distinct unique_id.
+        if self.trace is not None:
+            self.trace.writelines(f"{unique_id}\n" for unique_id in unique_ids)
+        result = {}
+        missing = unique_ids
+        if self.is_cached():
+            missing = []
+            for unique_id in unique_ids:
+                try:
+                    result[unique_id] = self.cache[unique_id]
+                    self.hits += 1
+                except KeyError:
+                    self.misses += 1
+                    missing.append(unique_id)
+        if missing and self.is_shared():
+            found = self.shared_cache.get_many(missing)
+            self.shared_hits += len(found)
+            if self.is_cached():
+                for unique_id, filepath in found.items():
+                    self.cache_put(unique_id, filepath)
+            result.update(found)
+            missing = [unique_id for unique_id in missing if unique_id not in found]
+        if missing:
+            result.update(self.fetch_many(missing))
+        return result
 
     def fetch(self, unique_id):
         """
@@ -47,11 +337,7 @@ class Translation:
         """
         logger.debug(f"Translation fetch: {unique_id}")
         try:
-            filepath = (
-                self.session.query(DataFile.filename)
-                .filter(DataFile.unique_id == unique_id)
-                .scalar()
-            )
+            filepath = self.query_filepath(unique_id)
         except MultipleResultsFound:
             raise KeyError(
                 f"Dataset id '{unique_id}' has multiple matches in metadata "
@@ -63,9 +349,93 @@ class Translation:
                 f"Dataset id '{unique_id}' not found in metadata database."
             )
         if self.is_cached():
-            self.cache[unique_id] = filepath
+            self.cache_put(unique_id, filepath)
+        if self.is_shared():
+            self.shared_cache.set_many({unique_id: filepath})
         return filepath
 
+    def store_rows(self, rows):
+        """
+        Cache (unique_id, filepath) rows from the database, in both tiers.
+        unique_ids with more than one row are not cached.
+
+        :return: (tuple) dict of cached unique_id -> filepath, and set of
+            unique_ids with more than one row.
+        """
+        stored = {}
+        duplicates = set()
+        for unique_id, filepath in rows:
+            if unique_id in stored:
+                duplicates.add(unique_id)
+            stored[unique_id] = filepath
+        for unique_id in duplicates:
+            del stored[unique_id]
+        if self.is_cached():
+            for unique_id, filepath in stored.items():
+                self.cache_put(unique_id, filepath)
+        if self.is_shared():
+            self.shared_cache.set_many(stored)
+        return stored, duplicates
+
+    def fetch_many(self, unique_ids):
+        """
+        Fetch filepaths corresponding to unique_ids from the database in a
+        single query. Cache the results if caching, and return a dict of
+        unique_id -> filepath. Raise KeyError if any unique_id cannot be
+        translated (having cached those that can).
+        """
+        unique_ids = list(unique_ids)
+        logger.debug(f"Translation fetch: {unique_ids}")
+        fetched, duplicates = self.store_rows(self.query_filepaths(unique_ids))
+        for unique_id in unique_ids:
+            if unique_id in duplicates:
+                raise KeyError(
+                    f"Dataset id '{unique_id}' has multiple matches in "
+                    f"metadata database.This is an internal error and should "
+                    f"be reported to PCIC staff."
+                )
+            if unique_id not in fetched:
+                raise KeyError(
+                    f"Dataset id '{unique_id}' not found in metadata database."
+                )
+        return fetched
+
+    # Database queries. These use the modelmeta ORM. `modelmeta` is imported
+    # only when first needed, since it (with `nchelpers`) is slow to import
+    # and is not needed at all by `CoreTranslation`.
+
+    def query_filepath(self, unique_id):
+        """
+        Return the filepath for unique_id, or None if there is none.
+        Raise MultipleResultsFound if there is more than one.
+        """
+        from modelmeta import DataFile
+
+        return (
+            self.session.query(DataFile.filename)
+            .filter(DataFile.unique_id == unique_id)
+            .scalar()
+        )
+
+    def query_filepaths(self, unique_ids):
+        """Return a list of (unique_id, filepath) rows for unique_ids."""
+        from modelmeta import DataFile
+
+        return (
+            self.session.query(DataFile.unique_id, DataFile.filename)
+            .filter(DataFile.unique_id.in_(unique_ids))
+            .all()
+        )
+
+    def query_all(self, limit=None):
+        """Return a list of (unique_id, filepath) rows, at most limit of them."""
+        from modelmeta import DataFile
+
+        query = self.session.query(DataFile.unique_id, DataFile.filename)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
     def preload(self):
         """
         Preload the cache with a bunch o data. With this query, there is no
@@ -76,10 +446,62 @@ class Translation:
         if not self.is_cached():
             logger.info(f"Cache preload: no caching")
             return
-        query = self.session.query(DataFile.unique_id, DataFile.filename)
-        if hasattr(self.cache, "maxsize"):
-            query = query.limit(self.cache.maxsize)
-        results = query.all()
+        results = self.query_all(limit=getattr(self.cache, "maxsize", None))
         for unique_id, filepath in results:
-            self.cache[unique_id] = filepath
+            self.cache_put(unique_id, filepath)
         logger.info(f"Cache preload: {len(self.cache)} items")
+
+
+# The part of the modelmeta schema used for translation, for `CoreTranslation`.
+data_files = Table(
+    "data_files",
+    MetaData(),
+    Column("unique_id", String),
+    Column("filename", String),
+)
+
+# Statements are constructed once; SQLAlchemy caches their compiled form.
+select_filepath = select(data_files.c.filename).where(
+    data_files.c.unique_id == bindparam("unique_id")
+)
+select_filepaths = select(data_files.c.unique_id, data_files.c.filename).where(
+    data_files.c.unique_id.in_(bindparam("unique_ids", expanding=True))
+)
+select_all = select(data_files.c.unique_id, data_files.c.filename)
+
+
+class CoreTranslation(Translation):
+    """
+    Translation that queries the database with prebuilt SQLAlchemy Core
+    statements on an engine, rather than through the modelmeta ORM and a
+    session. Avoids importing `modelmeta` and `sqlalchemy.orm` altogether.
+    """
+
+    def __init__(self, engine, cache=None, shared_cache=None, trace=None):
+        """
+        Constructor.
+
+        :param engine: SQLAlchemy engine for modelmeta database
+        :param cache: As for Translation.
+        :param shared_cache: As for Translation.
+        :param trace: As for Translation.
+        """
+        super().__init__(None, cache=cache, shared_cache=shared_cache, trace=trace)
+        self.engine = engine
+
+    def query_filepath(self, unique_id):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select_filepath, {"unique_id": unique_id}
+            ).scalar_one_or_none()
+
+    def query_filepaths(self, unique_ids):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select_filepaths, {"unique_ids": list(unique_ids)}
+            ).all()
+
+    def query_all(self, limit=None):
+        statement = select_all if limit is None else select_all.limit(limit)
+        with self.engine.connect() as connection:
+            return connection.execute(statement).all()
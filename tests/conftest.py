@@ -0,0 +1,122 @@
+import re
+import time
+import pytest
+
+
+class InProcessRedis:
+    """
+    In-process stand-in for a Redis client, implementing the subset of the
+    `redis.Redis` interface used by the shared translation cache. Like a Redis
+    client without `decode_responses`, it returns values as bytes.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.round_trips = 0
+
+    def _live(self, key):
+        key = key.decode() if isinstance(key, bytes) else key
+        expires = self.expiry.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def _set(self, name, value, ex=None):
+        self.data[name] = value.encode() if isinstance(value, str) else value
+        if ex is None:
+            self.expiry.pop(name, None)
+        else:
+            self.expiry[name] = time.monotonic() + ex
+        return True
+
+    def _sadd(self, name, *values):
+        if not self._live(name):
+            self.data[name] = set()
+        members = self.data[name]
+        added = {
+            value.encode() if isinstance(value, str) else value for value in values
+        }
+        count = len(added - members)
+        members |= added
+        return count
+
+    def _smembers(self, name):
+        name = name.decode() if isinstance(name, bytes) else name
+        return set(self.data[name]) if self._live(name) else set()
+
+    def _expire(self, name, time_):
+        if not self._live(name):
+            return False
+        self.expiry[name] = time.monotonic() + time_
+        return True
+
+    def scan_iter(self, match="*", count=None):
+        self.round_trips += 1
+        # Redis glob pattern, supporting *, ? and backslash escapes.
+        pattern = re.compile(
+            "".join(
+                {"*": ".*", "?": "."}.get(token, re.escape(token[-1]))
+                for token in re.findall(r"\\.|.", match, re.DOTALL)
+            )
+        )
+        for name in list(self.data):
+            if self._live(name) and pattern.fullmatch(name):
+                yield name.encode()
+
+    def get(self, name):
+        self.round_trips += 1
+        return self.data[name] if self._live(name) else None
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self.data[key] if self._live(key) else None for key in keys]
+
+    def set(self, name, value, ex=None):
+        self.round_trips += 1
+        return self._set(name, value, ex=ex)
+
+    def delete(self, *names):
+        self.round_trips += 1
+        return sum(
+            self.data.pop(name, None) is not None
+            for name in names
+            if self._live(name)
+        )
+
+    def pipeline(self, transaction=True):
+        return InProcessPipeline(self)
+
+
+class InProcessPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, name, value, ex=None):
+        self.commands.append((self.client._set, (name, value), {"ex": ex}))
+        return self
+
+    def sadd(self, name, *values):
+        self.commands.append((self.client._sadd, (name, *values), {}))
+        return self
+
+    def smembers(self, name):
+        self.commands.append((self.client._smembers, (name,), {}))
+        return self
+
+    def expire(self, name, time_):
+        self.commands.append((self.client._expire, (name, time_), {}))
+        return self
+
+    def execute(self):
+        self.client.round_trips += 1
+        results = [command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+@pytest.fixture
+def redis_client():
+    return InProcessRedis()
@@ -37,9 +37,8 @@ class TestHelpers:
 
         reload_dataset_params(translations, dataset_param_names, params)
 
-        translations.fetch.assert_any_call("abc")
-        translations.fetch.assert_any_call("def")
-        assert translations.fetch.call_count == 2
+        translations.fetch_many.assert_called_once()
+        assert list(translations.fetch_many.call_args[0][0]) == ["abc", "def"]
 
     def test_preload_populates_cache(self):
         session = MagicMock()
@@ -0,0 +1,41 @@
+from ncwms_mm_rproxy.invalidation import InvalidationLog
+
+
+def test_publish_and_poll(tmp_path):
+    path = str(tmp_path / "invalidations.log")
+    a = InvalidationLog(path)
+    b = InvalidationLog(path)
+
+    a.publish({"ids": ["x"]})
+    b.publish({"paths": ["/y.nc"]})
+
+    assert a.poll() == [{"paths": ["/y.nc"]}]
+    assert b.poll() == [{"ids": ["x"]}]
+    assert a.poll() == b.poll() == []
+
+
+def test_existing_entries_not_applied(tmp_path):
+    path = str(tmp_path / "invalidations.log")
+    InvalidationLog(path).publish({"ids": ["x"]})
+    assert InvalidationLog(path).poll() == []
+
+
+def test_incomplete_entry_left_for_next_poll(tmp_path):
+    path = tmp_path / "invalidations.log"
+    log = InvalidationLog(str(path))
+    with open(path, "a") as file:
+        file.write('{"ids": ["x"]}\n{"ids": ')
+    assert log.poll() == [{"ids": ["x"]}]
+    with open(path, "a") as file:
+        file.write('["y"]}\n')
+    assert log.poll() == [{"ids": ["y"]}]
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / "invalidations.log"
+    path.write_text('{"ids": ["x"]}\n')
+    log = InvalidationLog(str(path))
+    path.write_text("")
+    assert log.poll() == []
+    InvalidationLog(str(path)).publish({"ids": ["y"]})
+    assert log.poll() == [{"ids": ["y"]}]
@@ -1,6 +1,10 @@
+import os
+import signal
 import pytest
 from unittest.mock import patch, MagicMock
-from ncwms_mm_rproxy import create_app
+from cachetools import LRUCache
+from ncwms_mm_rproxy import after_fork, create_app
+from ncwms_mm_rproxy.translation import CoreTranslation
 
 
 @pytest.fixture
@@ -14,6 +18,7 @@ def app():
         "EXCLUDED_REQUEST_HEADERS": "",
         "EXCLUDED_RESPONSE_HEADERS": "",
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "ADMIN_TOKEN": "secret",
     }
 
     # Patch preload to avoid DB call during app startup
@@ -21,11 +26,33 @@ def app():
         return create_app(config)
 
 
+@pytest.fixture
+def make_app():
+    def make_app(**overrides):
+        config = {
+            "TESTING": True,
+            "NCWMS_URL": "http://example.com/fake-ncwms",
+            "TRANSLATION_CACHE": {},
+            "NCWMS_LAYER_PARAM_NAMES": {"layer"},
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "ADMIN_TOKEN": "secret",
+            **overrides,
+        }
+        # Patch preload to avoid DB call during app startup
+        with patch("ncwms_mm_rproxy.Translation.preload"):
+            return create_app(config)
+
+    return make_app
+
+
 @pytest.fixture
 def client(app):
     return app.test_client()
 
 
+admin_headers = {"Authorization": "Bearer secret"}
+
+
 class TestAppEndpoints:
     def test_healthz(self, client):
         response = client.get("/health")
@@ -60,3 +87,251 @@ class TestAppEndpoints:
         assert response.status_code == 200
         assert response.data == b"ok"
         assert mock_get.call_count == 2
+
+
+class TestConfigReload:
+    def test_admin_requires_token(self, client):
+        assert client.post("/admin/reload").status_code == 401
+        response = client.post(
+            "/admin/reload", headers={"Authorization": "Bearer wrong"}
+        )
+        assert response.status_code == 401
+
+    def test_admin_disabled_without_token(self, app, client):
+        app.config["ADMIN_TOKEN"] = None
+        response = client.post("/admin/reload", headers=admin_headers)
+        assert response.status_code == 404
+
+    @patch("ncwms_mm_rproxy.requests.get")
+    def test_reload_applies_new_settings(self, mock_get, app, client):
+        mock_get.return_value = MagicMock(status_code=200, raw=b"ok", headers={})
+        app.config["NCWMS_URL"] = "http://example.com/other-ncwms"
+        app.config["NCWMS_DATASET_PARAM_NAMES"] = {"dataset"}
+
+        response = client.post("/admin/reload", headers=admin_headers)
+        assert response.status_code == 200
+
+        translations = app.extensions["ncwms_mm_rproxy"]["translations"]
+        translations.cache["abc"] = "/abc.nc"
+        client.get("/dynamic/dyn?DATASET=abc")
+        args, kwargs = mock_get.call_args
+        assert args[0] == "http://example.com/other-ncwms"
+        assert kwargs["params"]["DATASET"] == "dyn/abc.nc"
+
+    def test_reload_migrates_cache(self, app, client):
+        translations = app.extensions["ncwms_mm_rproxy"]["translations"]
+        translations.cache["abc"] = "/abc.nc"
+        app.config["TRANSLATION_CACHE"] = LRUCache(maxsize=10)
+
+        response = client.post("/admin/reload", headers=admin_headers)
+        assert response.json == {
+            "cache_type": "LRUCache",
+            "cache_size": 1,
+            "broadcast": False,
+        }
+        assert translations.cache is app.config["TRANSLATION_CACHE"]
+        assert translations.cache["abc"] == "/abc.nc"
+
+    @patch("ncwms_mm_rproxy.requests.get")
+    def test_reload_reaches_other_workers(self, mock_get, make_app, tmp_path):
+        mock_get.return_value = MagicMock(status_code=200, raw=b"ok", headers={})
+        log = str(tmp_path / "invalidations.log")
+        workers = [make_app(TRANSLATION_INVALIDATION_LOG=log) for _ in range(2)]
+        # As if the configuration file had changed.
+        for worker in workers:
+            worker.config["NCWMS_URL"] = "http://example.com/other-ncwms"
+            translations = worker.extensions["ncwms_mm_rproxy"]["translations"]
+            translations.cache_put("abc", "/abc.nc")
+
+        response = (
+            workers[0].test_client().post("/admin/reload", headers=admin_headers)
+        )
+        assert response.json["broadcast"] is True
+
+        workers[1].test_client().get("/dynamic/dyn?LAYER=abc")
+        assert mock_get.call_args[0][0] == "http://example.com/other-ncwms"
+
+    def test_failed_reload_is_not_broadcast(self, make_app, tmp_path):
+        log = str(tmp_path / "invalidations.log")
+        app = make_app(TRANSLATION_INVALIDATION_LOG=log)
+        app.config["NCWMS_LAYER_PARAM_NAMES"] = 1
+        response = app.test_client().post("/admin/reload", headers=admin_headers)
+        assert response.status_code == 500
+        assert not os.path.exists(log)
+
+    @patch("ncwms_mm_rproxy.requests.get")
+    def test_reload_on_signal(self, mock_get, make_app):
+        mock_get.return_value = MagicMock(status_code=200, raw=b"ok", headers={})
+        previous = signal.getsignal(signal.SIGUSR2)
+        try:
+            app = make_app(
+                TRANSLATION_CACHE={"abc": "/abc.nc"},
+                CONFIG_RELOAD_SIGNAL="SIGUSR2",
+            )
+            app.config["NCWMS_URL"] = "http://example.com/other-ncwms"
+            os.kill(os.getpid(), signal.SIGUSR2)
+            app.test_client().get("/dynamic/dyn?LAYER=abc")
+        finally:
+            signal.signal(signal.SIGUSR2, previous)
+        assert mock_get.call_args[0][0] == "http://example.com/other-ncwms"
+
+
+class TestCacheAdmin:
+    @pytest.fixture
+    def translations(self, app):
+        translations = app.extensions["ncwms_mm_rproxy"]["translations"]
+        translations.cache_put("a", "/data/x/a.nc")
+        translations.cache_put("b", "/data/y/b.nc")
+        return translations
+
+    def test_requires_token(self, client, translations):
+        assert client.get("/admin/cache").status_code == 401
+        assert client.delete("/admin/cache/entries/a").status_code == 401
+        assert translations.peek("a") == "/data/x/a.nc"
+
+    def test_stats(self, client, translations):
+        response = client.get("/admin/cache", headers=admin_headers)
+        assert response.json["size"] == 2
+        assert response.json["type"] == "dict"
+
+    def test_entries(self, client, translations):
+        response = client.get("/admin/cache/entries", headers=admin_headers)
+        assert response.json["entries"] == {
+            "a": "/data/x/a.nc",
+            "b": "/data/y/b.nc",
+        }
+        response = client.get(
+            "/admin/cache/entries?prefix=/data/y/", headers=admin_headers
+        )
+        assert response.json == {"total": 1, "entries": {"b": "/data/y/b.nc"}}
+
+    def test_entry(self, client, translations):
+        response = client.get("/admin/cache/entries/a", headers=admin_headers)
+        assert response.json == {"unique_id": "a", "filepath": "/data/x/a.nc"}
+        response = client.get("/admin/cache/entries/zz", headers=admin_headers)
+        assert response.status_code == 404
+
+    def test_invalidate_by_id(self, client, translations):
+        response = client.delete("/admin/cache/entries/a", headers=admin_headers)
+        assert response.json == {"invalidated": ["a"]}
+        assert translations.peek("a") is None
+
+    def test_invalidate_by_path_and_prefix(self, client, translations):
+        response = client.post(
+            "/admin/cache/invalidate",
+            json={"paths": ["/data/x/a.nc"], "prefixes": ["/data/y/"]},
+            headers=admin_headers,
+        )
+        assert response.json == {"invalidated": ["a", "b"]}
+        assert len(translations.cache) == 0
+
+    def test_invalidate_requires_selection(self, client, translations):
+        response = client.post(
+            "/admin/cache/invalidate", json={}, headers=admin_headers
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {"ids": ["nonexistent"], "prefixes": "/data/"},
+            {"ids": ["a"], "paths": [["/data/x/a.nc"]]},
+            {"ids": ["a"], "prefixes": [None]},
+            ["a"],
+        ],
+    )
+    def test_invalidate_rejects_invalid_body(self, client, translations, body):
+        response = client.post(
+            "/admin/cache/invalidate", json=body, headers=admin_headers
+        )
+        assert response.status_code == 400
+        assert len(translations.cache) == 2
+
+    def test_refresh(self, client, translations):
+        with patch.object(
+            translations, "query_filepaths", return_value=[("a", "/moved/a.nc")]
+        ) as query_filepaths:
+            response = client.post(
+                "/admin/cache/refresh",
+                json={"prefixes": ["/data/x/"]},
+                headers=admin_headers,
+            )
+        query_filepaths.assert_called_once_with(["a"])
+        assert response.json == {"refreshed": {"a": "/moved/a.nc"}, "failed": []}
+
+    def test_invalidation_reaches_other_workers(self, make_app, tmp_path):
+        log = str(tmp_path / "invalidations.log")
+        workers = [make_app(TRANSLATION_INVALIDATION_LOG=log) for _ in range(2)]
+        caches = [
+            worker.extensions["ncwms_mm_rproxy"]["translations"] for worker in workers
+        ]
+        for translations in caches:
+            translations.cache_put("a", "/data/a.nc")
+            translations.cache_put("b", "/data/b.nc")
+            translations.cache_put("c", "/other/c.nc")
+
+        response = (
+            workers[0]
+            .test_client()
+            .post(
+                "/admin/cache/invalidate",
+                json={"ids": ["c"], "prefixes": ["/data/"]},
+                headers=admin_headers,
+            )
+        )
+        assert response.status_code == 200
+        assert set(caches[1].cache) == {"a", "b", "c"}
+
+        # The other worker applies the invalidation before its next request.
+        workers[1].test_client().get("/health")
+        assert caches[1].cache == {}
+
+    @patch("ncwms_mm_rproxy.requests.get")
+    def test_dynamic_translates_from_shared_cache(
+        self, mock_get, make_app, redis_client
+    ):
+        mock_get.return_value = MagicMock(status_code=200, raw=b"ok", headers={})
+        redis_client.set("t:a", "/a.nc")
+        redis_client.set("t:b", "/b.nc")
+        redis_client.round_trips = 0
+        app = make_app(
+            TRANSLATION_CACHE=None,
+            NCWMS_LAYER_PARAM_NAMES={"layers"},
+            NCWMS_DATASET_PARAM_NAMES={"dataset"},
+            TRANSLATION_SHARED_CACHE=redis_client,
+            TRANSLATION_SHARED_CACHE_PREFIX="t:",
+        )
+
+        app.test_client().get("/dynamic/dyn?LAYERS=a/tas,b/pr&DATASET=a")
+
+        params = mock_get.call_args[1]["params"]
+        assert params["LAYERS"] == "dyn/a.nc/tas,dyn/b.nc/pr"
+        assert params["DATASET"] == "dyn/a.nc"
+        assert redis_client.round_trips == 1
+
+
+class TestLeanMode:
+    @pytest.fixture
+    def lean_app(self, make_app):
+        return make_app(LEAN_MODE=True, TRANSLATION_CACHE={"abc": "/abc.nc"})
+
+    def test_uses_core_translation(self, lean_app):
+        translations = lean_app.extensions["ncwms_mm_rproxy"]["translations"]
+        assert isinstance(translations, CoreTranslation)
+        assert "sqlalchemy" not in lean_app.extensions
+
+    @patch("ncwms_mm_rproxy.requests.get")
+    def test_dynamic(self, mock_get, lean_app):
+        mock_get.return_value = MagicMock(status_code=200, raw=b"ok", headers={})
+        lean_app.test_client().get("/dynamic/dyn?LAYER=abc/tas")
+        assert mock_get.call_args[1]["params"]["LAYER"] == "dyn/abc.nc/tas"
+
+    def test_startup_timings(self, lean_app):
+        timings = lean_app.extensions["ncwms_mm_rproxy"]["startup_timings"]
+        assert set(timings) == {"config", "database", "preload", "total"}
+
+    def test_after_fork(self, lean_app):
+        translations = lean_app.extensions["ncwms_mm_rproxy"]["translations"]
+        with patch.object(translations.engine, "dispose") as dispose:
+            after_fork(lean_app)
+        dispose.assert_called_once_with(close=False)
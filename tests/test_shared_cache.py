@@ -0,0 +1,167 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from ncwms_mm_rproxy.shared_cache import SharedCache
+from ncwms_mm_rproxy.translation import Translation
+
+
+def batch_session(rows):
+    session = MagicMock()
+    session.query.return_value.filter.return_value.all.return_value = rows
+    return session
+
+
+class TestSharedCache:
+    def test_set_and_get_many(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"a": "/a.nc", "b": "/b.nc"})
+        assert redis_client.round_trips == 1
+        assert shared.get_many(["a", "b", "c"]) == {"a": "/a.nc", "b": "/b.nc"}
+        assert redis_client.round_trips == 2
+
+    def test_keys_are_prefixed(self, redis_client):
+        SharedCache(redis_client, prefix="p:").set_many({"a": "/a.nc"})
+        assert list(redis_client.data) == ["p:a", "p:paths:/a.nc"]
+
+    def test_ttl(self, redis_client):
+        SharedCache(redis_client, ttl=60).set_many({"a": "/a.nc"})
+        assert "ncwms-mm-rproxy:translation:a" in redis_client.expiry
+
+    def test_delete_many(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"a": "/a.nc", "b": "/b.nc"})
+        shared.delete_many(["a"])
+        assert shared.get_many(["a", "b"]) == {"b": "/b.nc"}
+
+    def test_path_index(self, redis_client):
+        shared = SharedCache(redis_client, ttl=60)
+        shared.set_many({"a": "/x/a.nc", "b": "/x/a.nc", "c": "/y/c.nc"})
+        assert redis_client.round_trips == 1
+        assert "ncwms-mm-rproxy:translation:paths:/x/a.nc" in redis_client.expiry
+        assert shared.ids_for_paths(["/x/a.nc", "/z.nc"]) == {"a", "b"}
+        assert shared.ids_for_prefixes(["/y/", "/x"]) == {"a", "b", "c"}
+        assert shared.ids_for_prefixes(["/*"]) == set()
+
+    def test_store_failure_is_a_miss(self):
+        client = MagicMock()
+        client.mget.side_effect = ConnectionError
+        assert SharedCache(client).get_many(["a"]) == {}
+
+    @patch("ncwms_mm_rproxy.shared_cache.logger")
+    def test_backs_off_after_failure(self, logger):
+        client = MagicMock()
+        client.mget.side_effect = ConnectionError
+        client.delete.side_effect = ConnectionError
+        shared = SharedCache(client, backoff=60)
+        assert shared.get_many(["a"]) == {}
+        assert shared.get_many(["b"]) == {}
+        shared.set_many({"b": "/b.nc"})
+        client.mget.assert_called_once()
+        client.pipeline.assert_not_called()
+
+        # Invalidations are attempted regardless.
+        shared.delete_many(["a"])
+        client.delete.assert_called_once()
+        # Logged once per backoff.
+        logger.warning.assert_called_once()
+
+    def test_recovers_after_backoff(self, redis_client):
+        shared = SharedCache(redis_client, backoff=0)
+        shared.set_many({"a": "/a.nc"})
+        shared.failed("get", ConnectionError())
+        assert shared.get_many(["a"]) == {"a": "/a.nc"}
+
+
+class TestTieredTranslation:
+    def test_get_falls_through_to_shared_cache(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"a": "/a.nc"})
+        session = MagicMock()
+        cache = {}
+        t = Translation(session, cache, shared_cache=shared)
+        assert t.get("a") == "/a.nc"
+        assert cache == {"a": "/a.nc"}
+        session.query.assert_not_called()
+        assert t.stats()["shared_hits"] == 1
+
+    def test_get_writes_database_result_to_both_tiers(self, redis_client):
+        shared = SharedCache(redis_client)
+        session = MagicMock()
+        session.query.return_value.filter.return_value.scalar.return_value = (
+            "/a.nc"
+        )
+        cache = {}
+        t = Translation(session, cache, shared_cache=shared)
+        assert t.get("a") == "/a.nc"
+        assert cache == {"a": "/a.nc"}
+        assert shared.get_many(["a"]) == {"a": "/a.nc"}
+
+    def test_get_many_consults_each_tier_once(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"b": "/b.nc"})
+        redis_client.round_trips = 0
+        session = batch_session([("c", "/c.nc"), ("d", "/d.nc")])
+        t = Translation(session, {"a": "/a.nc"}, shared_cache=shared)
+        assert t.get_many(["a", "b", "c", "d", "a"]) == {
+            "a": "/a.nc",
+            "b": "/b.nc",
+            "c": "/c.nc",
+            "d": "/d.nc",
+        }
+        session.query.assert_called_once()
+        # One lookup of the misses, one pipelined write back.
+        assert redis_client.round_trips == 2
+        assert shared.get_many(["c", "d"]) == {"c": "/c.nc", "d": "/d.nc"}
+        assert dict(t.cache) == {
+            "a": "/a.nc",
+            "b": "/b.nc",
+            "c": "/c.nc",
+            "d": "/d.nc",
+        }
+
+    def test_get_many_without_caches(self):
+        session = batch_session([("a", "/a.nc")])
+        t = Translation(session, None)
+        assert t.get_many(["a"]) == {"a": "/a.nc"}
+
+    def test_get_many_missing(self):
+        session = batch_session([("a", "/a.nc")])
+        cache = {}
+        t = Translation(session, cache)
+        with pytest.raises(KeyError, match="'b' not found"):
+            t.get_many(["a", "b"])
+        assert cache == {"a": "/a.nc"}
+
+    def test_get_many_multiple_matches(self):
+        session = batch_session([("a", "/a.nc"), ("a", "/a2.nc")])
+        t = Translation(session, {})
+        with pytest.raises(KeyError, match="multiple matches"):
+            t.get_many(["a"])
+
+    def test_invalidate_removes_from_shared_cache(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"a": "/a.nc"})
+        t = Translation(MagicMock(), {"a": "/a.nc"}, shared_cache=shared)
+        t.invalidate(["a"])
+        assert shared.get_many(["a"]) == {}
+
+    def test_invalidate_by_path_and_prefix_reaches_shared_cache(self, redis_client):
+        # Translations cached by another worker, not in this one's cache.
+        SharedCache(redis_client).set_many(
+            {"a": "/data/a.nc", "b": "/data/b.nc", "c": "/data[1]/c.nc"}
+        )
+        shared = SharedCache(redis_client)
+        t = Translation(MagicMock(), {}, shared_cache=shared)
+
+        assert t.select(paths=["/data/a.nc"]) == {"a"}
+        assert t.select(paths=["/data/a.nc"], shared=False) == set()
+        t.invalidate(t.select(prefixes=["/data/"]))
+        assert shared.get_many(["a", "b", "c"]) == {"c": "/data[1]/c.nc"}
+        assert t.select(prefixes=["/data["]) == {"c"}
+
+    def test_refresh_updates_shared_cache(self, redis_client):
+        shared = SharedCache(redis_client)
+        shared.set_many({"a": "/a.nc", "b": "/b.nc"})
+        session = batch_session([("a", "/new/a.nc")])
+        t = Translation(session, {}, shared_cache=shared)
+        assert t.refresh(["a", "b"]) == ({"a": "/new/a.nc"}, ["b"])
+        assert shared.get_many(["a", "b"]) == {"a": "/new/a.nc"}
@@ -0,0 +1,28 @@
+from ncwms_mm_rproxy.startup import import_times, top_level_import_times
+
+
+class TestStartup:
+    def test_import_times(self):
+        times = import_times("json")
+        assert ("json", 0) == next(
+            (name, depth) for name, _, _, depth in times if name == "json"
+        )
+
+    def test_top_level_import_times(self):
+        times = [
+            # Interpreter startup.
+            ("encodings.aliases", 0.1, 0.1, 1),
+            ("encodings", 0.1, 0.2, 0),
+            ("site", 0.1, 0.1, 0),
+            ("flask.app", 0.1, 0.2, 2),
+            ("flask", 0.1, 0.3, 1),
+            ("requests", 0.1, 0.1, 1),
+            ("sqlalchemy", 0.1, 0.5, 1),
+            ("ncwms_mm_rproxy", 0.1, 1.0, 0),
+            ("atexit", 0.1, 0.1, 1),
+        ]
+        assert top_level_import_times(times) == [
+            ("sqlalchemy", 0.5),
+            ("flask", 0.3),
+            ("requests", 0.1),
+        ]
@@ -0,0 +1,108 @@
+import pytest
+from cachetools import LRUCache
+from ncwms_mm_rproxy.tinylfu import FrequencySketch, TinyLFUCache
+from ncwms_mm_rproxy.replay import compare, main, read_trace, replay
+
+
+class TestFrequencySketch:
+    def test_estimate(self):
+        sketch = FrequencySketch(64)
+        for _ in range(5):
+            sketch.increment("a")
+        sketch.increment("b")
+        assert sketch.estimate("a") >= 5
+        assert sketch.estimate("b") >= 1
+        assert sketch.estimate("a") > sketch.estimate("b")
+
+    def test_saturates(self):
+        sketch = FrequencySketch(64, max_count=3)
+        for _ in range(10):
+            sketch.increment("a")
+        assert sketch.estimate("a") == 4
+
+    def test_ages(self):
+        sketch = FrequencySketch(4)
+        for _ in range(8):
+            sketch.increment("a")
+        assert sketch.estimate("a") == 8
+        for i in range(sketch.sample_size):
+            sketch.increment(f"k{i}")
+        assert sketch.estimate("a") < 8
+
+
+class TestTinyLFUCache:
+    def test_mapping(self):
+        cache = TinyLFUCache(maxsize=10)
+        cache["a"] = "/a.nc"
+        assert cache["a"] == "/a.nc"
+        assert "a" in cache
+        assert dict(cache.items()) == {"a": "/a.nc"}
+        del cache["a"]
+        assert len(cache) == 0
+        with pytest.raises(KeyError):
+            cache["a"]
+
+    def test_bounded(self):
+        cache = TinyLFUCache(maxsize=10)
+        for i in range(100):
+            cache[i] = i
+        assert len(cache) <= 10
+
+    @pytest.mark.parametrize("maxsize", [0, -1])
+    def test_invalid_maxsize(self, maxsize):
+        with pytest.raises(ValueError):
+            TinyLFUCache(maxsize=maxsize)
+
+    def test_hit_rate(self):
+        cache = TinyLFUCache(maxsize=10)
+        cache["a"] = "/a.nc"
+        cache["a"]
+        with pytest.raises(KeyError):
+            cache["b"]
+        assert cache.hit_rate == 0.5
+
+    def test_peek_is_not_an_access(self):
+        cache = TinyLFUCache(maxsize=10)
+        cache["a"] = "/a.nc"
+        assert cache.peek("a") == "/a.nc"
+        assert cache.hits == 0
+        assert cache.sketch.estimate("a") == 0
+
+    def test_scan_resistant(self):
+        hot = [f"hot{i}" for i in range(50)]
+        scan = [f"scan{i}" for i in range(1000)]
+        trace = hot * 10 + scan
+        tinylfu = TinyLFUCache(maxsize=100)
+        replay(trace, tinylfu)
+        lru = LRUCache(maxsize=100)
+        replay(trace, lru)
+        # Frequency estimates are approximate, so the odd hot key may be lost.
+        assert sum(key in tinylfu for key in hot) >= 45
+        assert not any(key in lru for key in hot)
+
+
+class TestReplay:
+    def test_read_trace(self):
+        assert read_trace(["a\n", "\n", " b \n"]) == ["a", "b"]
+
+    def test_replay(self):
+        assert replay(["a", "b", "a", "a"], {}) == (2, 4)
+
+    def test_compare(self):
+        trace = ["a", "b", "a", "b"]
+        rows = compare(trace, [1, 2], ["lru"])
+        assert rows == [("dict", None, 0.5), ("lru", 1, 0.0), ("lru", 2, 0.5)]
+
+    @pytest.mark.parametrize("size", ["0", "-5", "x"])
+    def test_main_rejects_invalid_size(self, tmp_path, size):
+        trace = tmp_path / "trace.txt"
+        trace.write_text("a\nb\na\n")
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(trace), "--sizes", "10", size])
+        assert exc_info.value.code == 2
+
+    def test_main(self, tmp_path, capsys):
+        trace = tmp_path / "trace.txt"
+        trace.write_text("a\nb\na\n")
+        main([str(trace), "--sizes", "1", "--policies", "tinylfu"])
+        assert "tinylfu" in capsys.readouterr().out
@@ -1,7 +1,11 @@
+import io
 import pytest
 from unittest.mock import MagicMock
+from cachetools import LRUCache, LFUCache
+from sqlalchemy import create_engine
 from sqlalchemy.orm.exc import MultipleResultsFound
-from ncwms_mm_rproxy.translation import Translation
+from ncwms_mm_rproxy.tinylfu import TinyLFUCache
+from ncwms_mm_rproxy.translation import CoreTranslation, Translation, data_files
 
 
 class TestTranslation:
@@ -56,3 +60,156 @@ class TestTranslation:
         t = Translation(session, {})
         with pytest.raises(KeyError, match="multiple matches"):
             t.get("dupe001")
+
+    def test_set_cache_same_type_and_size_retains_cache(self):
+        cache = LRUCache(maxsize=10)
+        cache["a"] = "/a.nc"
+        t = Translation(MagicMock(), cache)
+        assert t.set_cache(LRUCache(maxsize=10)) is cache
+        assert t.get("a") == "/a.nc"
+
+    def test_set_cache_migrates_entries(self):
+        t = Translation(MagicMock(), {"a": "/a.nc", "b": "/b.nc"})
+        new_cache = LFUCache(maxsize=10)
+        assert t.set_cache(new_cache) is new_cache
+        assert dict(new_cache) == {"a": "/a.nc", "b": "/b.nc"}
+
+    def test_set_cache_migration_respects_maxsize(self):
+        t = Translation(MagicMock(), {"a": "/a.nc", "b": "/b.nc", "c": "/c.nc"})
+        new_cache = LRUCache(maxsize=2)
+        t.set_cache(new_cache)
+        assert len(new_cache) == 2
+
+    def test_set_cache_none_disables_caching(self):
+        t = Translation(MagicMock(), {"a": "/a.nc"})
+        t.set_cache(None)
+        assert t.is_cached() is False
+
+    def test_reverse_index_by_path_and_prefix(self):
+        session = MagicMock()
+        session.query.return_value.all.return_value = [
+            ("a", "/data/x/a.nc"),
+            ("a2", "/data/x/a.nc"),
+            ("b", "/data/y/b.nc"),
+        ]
+        t = Translation(session, {})
+        t.preload()
+        assert t.ids_for_path("/data/x/a.nc") == {"a", "a2"}
+        assert t.ids_for_prefix("/data/") == {"a", "a2", "b"}
+        assert t.ids_for_prefix("/data/y/") == {"b"}
+
+    def test_reverse_index_follows_changed_translation(self):
+        session = MagicMock()
+        session.query.return_value.filter.return_value.scalar.return_value = (
+            "/new/a.nc"
+        )
+        t = Translation(session, {"a": "/old/a.nc"})
+        assert t.ids_for_path("/old/a.nc") == {"a"}
+        t.fetch("a")
+        assert t.ids_for_path("/old/a.nc") == set()
+        assert t.ids_for_path("/new/a.nc") == {"a"}
+
+    def test_reverse_index_ignores_evicted_entries(self):
+        t = Translation(MagicMock(), LRUCache(maxsize=1))
+        t.cache_put("a", "/a.nc")
+        t.cache_put("b", "/b.nc")
+        assert t.ids_for_path("/a.nc") == set()
+        assert t.ids_for_prefix("/") == {"b"}
+
+    def test_invalidate(self):
+        t = Translation(MagicMock(), {"a": "/a.nc", "b": "/b.nc"})
+        assert t.invalidate(["a", "missing"]) == ["a"]
+        assert dict(t.cache) == {"b": "/b.nc"}
+        assert t.ids_for_path("/a.nc") == set()
+
+    def test_refresh_removes_untranslatable(self):
+        session = MagicMock()
+        session.query.return_value.filter.return_value.all.return_value = [
+            ("a", "/new/a.nc"),
+            ("c", "/c1.nc"),
+            ("c", "/c2.nc"),
+        ]
+        t = Translation(session, {"a": "/a.nc", "b": "/b.nc", "c": "/c.nc"})
+        assert t.refresh(["a", "b", "c"]) == ({"a": "/new/a.nc"}, ["b", "c"])
+        # A single query.
+        session.query.assert_called_once()
+        assert dict(t.cache) == {"a": "/new/a.nc"}
+
+    def test_peek_does_not_affect_eviction(self):
+        t = Translation(MagicMock(), LRUCache(maxsize=2))
+        t.cache_put("a", "/a.nc")
+        t.cache_put("b", "/b.nc")
+        assert t.peek("a") == "/a.nc"
+        t.cache_put("c", "/c.nc")
+        # "a" is still least recently used, despite the peek.
+        assert "a" not in t.cache
+
+    def test_stats_counts_hits_and_misses(self):
+        session = MagicMock()
+        session.query.return_value.filter.return_value.scalar.return_value = (
+            "/b.nc"
+        )
+        t = Translation(session, {"a": "/a.nc"})
+        t.get("a")
+        t.get("b")
+        stats = t.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 2)
+
+    def test_trace(self):
+        trace = io.StringIO()
+        t = Translation(MagicMock(), {"a": "/a.nc", "b": "/b.nc"}, trace=trace)
+        t.get("a")
+        t.get_many(["b", "a", "b"])
+        assert trace.getvalue() == "a\nb\na\n"
+
+    def test_peek_uses_cache_peek(self):
+        cache = TinyLFUCache(maxsize=10)
+        t = Translation(MagicMock(), cache)
+        t.cache_put("a", "/a.nc")
+        assert t.peek("a") == "/a.nc"
+        assert cache.hits == 0
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    data_files.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            data_files.insert(),
+            [
+                {"unique_id": "a", "filename": "/a.nc"},
+                {"unique_id": "b", "filename": "/b.nc"},
+                {"unique_id": "dupe", "filename": "/dupe1.nc"},
+                {"unique_id": "dupe", "filename": "/dupe2.nc"},
+            ],
+        )
+    return engine
+
+
+class TestCoreTranslation:
+    def test_get(self, engine):
+        cache = {}
+        t = CoreTranslation(engine, cache)
+        assert t.get("a") == "/a.nc"
+        assert cache == {"a": "/a.nc"}
+
+    def test_get_many(self, engine):
+        t = CoreTranslation(engine, {})
+        assert t.get_many(["a", "b"]) == {"a": "/a.nc", "b": "/b.nc"}
+
+    def test_keyerror_on_missing_dataset(self, engine):
+        t = CoreTranslation(engine, {})
+        with pytest.raises(KeyError, match="not found"):
+            t.get("missing")
+
+    def test_keyerror_on_multiple_matches(self, engine):
+        t = CoreTranslation(engine, {})
+        with pytest.raises(KeyError, match="multiple matches"):
+            t.get("dupe")
+
+    def test_preload(self, engine):
+        cache = LRUCache(maxsize=2)
+        t = CoreTranslation(engine, cache)
+        t.preload()
+        assert len(cache) == 2